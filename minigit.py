@@ -1,7 +1,377 @@
 import os
+import sys
+import mmap
+import stat
+import struct
+import pickle
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import errno
 import hashlib
 import shutil
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:  # Blobs are stored uncompressed
+    zstandard = None
+
+
+# ioctl request that reflinks one file's extents into another (Linux).
+FICLONE = 0x40049409
+
+# ioctl requests and inode flag used to turn off copy-on-write (Linux).
+FS_IOC_GETFLAGS = 0x80086601
+FS_IOC_SETFLAGS = 0x40086602
+FS_NOCOW_FL = 0x00800000
+
+# Errors meaning the filesystem cannot clone, so a plain copy is needed.
+CLONE_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.EINVAL,
+    errno.ENOTTY,
+}
+
+# Errors meaning copy_file_range() or sendfile() cannot copy between files.
+KERNEL_COPY_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+}
+
+# Most bytes requested from a single copy_file_range() or sendfile() call.
+KERNEL_COPY_SIZE = 1 << 30
+
+# Object ids are 20-byte BLAKE2b digests, printed as 40 hex characters.
+DIGEST_SIZE = 20
+
+# Refs files hold one hex commit hash and a newline per commit.
+REF_ENTRY_SIZE = 2 * DIGEST_SIZE + 1
+
+# Block size used when reading a branch log backwards from its end.
+LOG_TAIL_BLOCK = 8192
+
+# Read size used when streaming file content.
+CHUNK_SIZE = 1 << 20
+
+# Files smaller than this are read whole with one read() call when staged.
+SMALL_BLOB_SIZE = 4096
+
+# Largest span of a file mapped into memory at once; a multiple of the
+# mmap allocation granularity, since windows are mapped at its offsets.
+MMAP_WINDOW = 256 << 20
+
+# Pending index entries are written out once they exceed this many bytes.
+INDEX_FLUSH_SIZE = 64 << 10
+
+# Pack record header: binary object id and length of the data that follows.
+PACK_RECORD = struct.Struct("<20sQ")
+
+# Pack index entry: binary object id, data offset and data length.
+PACK_INDEX_ENTRY = struct.Struct("<20sQQ")
+
+# Length written into a pack record header until its data is complete, so
+# a record cut short by a crash reads as running past the end of the pack.
+PACK_PENDING_LENGTH = (1 << 64) - 1
+
+# Prefix of a zstd-compressed pack record; the raw length follows as a varint.
+ZSTD_MAGIC = b"zstd1\0"
+
+# Compression level, and the smallest blob worth compressing.
+ZSTD_LEVEL = 3
+COMPRESS_MIN_SIZE = 256
+
+# Smallest blob worth starting zstd worker threads for; below it the
+# thread pool costs more than it saves.
+COMPRESS_THREADS_MIN_SIZE = CHUNK_SIZE
+
+# Files modified this recently are not trusted to the stat cache, since a
+# further change within the timestamp granularity would go unnoticed.
+RACY_WINDOW_NS = 2_000_000_000
+
+# Errors meaning a hard link cannot be made, so the file must be copied.
+LINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK}
+
+
+def _encode_varint(value):
+    """
+    Encodes a non-negative integer as a little-endian base-128 varint.
+
+    Args:
+        value (int): Integer to encode.
+
+    Returns:
+        bytes: The encoded integer.
+    """
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _decode_varint(data, offset):
+    """
+    Decodes a little-endian base-128 varint.
+
+    Args:
+        data (bytes): Buffer holding the varint.
+        offset (int): Position of the varint's first byte.
+
+    Returns:
+        tuple: The decoded integer and the offset just past it.
+    """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _zstd_compressor(size):
+    """
+    Creates a zstd compressor suited to a blob of the given size.
+
+    Args:
+        size (int): Raw length of the blob to compress.
+
+    Returns:
+        zstandard.ZstdCompressor: Multithreaded only for large blobs.
+    """
+    threads = -1 if size >= COMPRESS_THREADS_MIN_SIZE else 0
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads)
+
+
+def _append_file(path, *chunks):
+    """
+    Appends byte strings to a file, creating it if needed, in one write call.
+
+    Args:
+        path (str): Path to the file.
+        *chunks (bytes): Data to append, in order.
+    """
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    fd = os.open(path, flags, 0o644)
+    try:
+        if hasattr(os, "writev"):
+            os.writev(fd, chunks)
+        else:
+            os.write(fd, b"".join(chunks))
+    finally:
+        os.close(fd)
+
+
+def _clonefile(src, dst):
+    """
+    Calls macOS clonefile(2) to create an APFS copy-on-write clone.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the destination, which must not exist yet.
+
+    Raises:
+        OSError: If the clone could not be created.
+    """
+    import ctypes
+
+    libc = ctypes.CDLL("libc.dylib", use_errno=True)
+    if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code), dst)
+
+
+def _try_clone(src, dst):
+    """
+    Creates dst as a copy-on-write clone of src where the filesystem allows it.
+
+    Uses a FICLONE reflink on Linux (XFS, Btrfs) and clonefile() on macOS
+    (APFS), so the copy shares data blocks with the source instead of
+    moving every byte.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the destination file.
+
+    Returns:
+        bool: True if dst was cloned, False if cloning is not supported.
+    """
+    try:
+        if sys.platform.startswith("linux") and fcntl is not None:
+            with open(src, "rb") as source, open(dst, "wb") as target:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            shutil.copymode(src, dst)
+            return True
+        if sys.platform == "darwin":
+            _clonefile(src, dst)
+            return True
+    except OSError as error:
+        if error.errno not in CLONE_UNSUPPORTED:
+            raise
+    return False
+
+
+def _kernel_copy(src, dst):
+    """
+    Copies a file without passing its data through user space (Linux).
+
+    Prefers copy_file_range(), which also lets the filesystem share or
+    offload the copy, and uses sendfile() where that is unavailable.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the destination file.
+
+    Returns:
+        bool: True if the file was copied, False if neither call works here.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+
+    with open(src, "rb") as source:
+        src_fd = source.fileno()
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while True:
+                if hasattr(os, "copy_file_range"):
+                    copied = os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_SIZE)
+                else:
+                    copied = os.sendfile(dst_fd, src_fd, None, KERNEL_COPY_SIZE)
+                if copied == 0:
+                    break
+        except OSError as error:
+            if error.errno not in KERNEL_COPY_UNSUPPORTED:
+                raise
+            return False
+        finally:
+            os.close(dst_fd)
+
+    shutil.copymode(src, dst)
+    return True
+
+
+def _cow_copy(src, dst):
+    """
+    Copies a file as a copy-on-write clone, or with an in-kernel copy when
+    the filesystem cannot clone. shutil.copy is the last resort.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the destination file.
+    """
+    if not _try_clone(src, dst) and not _kernel_copy(src, dst):
+        shutil.copy(src, dst)
+
+
+def _cow_copytree(src, dst, copy_function=_cow_copy):
+    """
+    Recursively copies a directory using copy-on-write clones.
+
+    On macOS the whole tree is cloned with a single clonefile() call.
+    Elsewhere the tree is walked by shutil.copytree and each file is
+    handed to copy_function, which clones it where the filesystem allows.
+
+    Args:
+        src (str): Path to the source directory.
+        dst (str): Path to the destination directory, which must not exist.
+        copy_function (callable): Copies one file, given (src, dst).
+    """
+    if sys.platform == "darwin":
+        parent = os.path.dirname(dst)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        try:
+            _clonefile(src, dst)
+            return
+        except OSError as error:
+            if error.errno not in CLONE_UNSUPPORTED:
+                raise
+
+    shutil.copytree(src, dst, copy_function=copy_function)
+
+
+def _is_btrfs(path):
+    """
+    Checks whether a path lives on a Btrfs filesystem, using /proc/mounts.
+
+    Args:
+        path (str): Path to check.
+
+    Returns:
+        bool: True if the longest matching mount point is Btrfs.
+    """
+    path = os.path.realpath(path)
+    fstype, match_length = None, -1
+    try:
+        with open("/proc/mounts", "r") as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                prefix = mount_point.rstrip("/") + "/"
+                inside = path == mount_point or path.startswith(prefix)
+                if inside and len(mount_point) > match_length:
+                    fstype, match_length = fields[2], len(mount_point)
+    except OSError:
+        return False
+    return fstype == "btrfs"
+
+
+def _disable_cow(path):
+    """
+    Sets the Btrfs NOCOW attribute on a directory.
+
+    Files created in the directory afterwards inherit the attribute, so
+    writing them skips copy-on-write bookkeeping. This is best effort:
+    other filesystems and platforms are left untouched.
+
+    Args:
+        path (str): Path to the directory.
+    """
+    if not sys.platform.startswith("linux") or fcntl is None or not _is_btrfs(path):
+        return
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        flags = struct.unpack("i", fcntl.ioctl(fd, FS_IOC_GETFLAGS, struct.pack("i", 0)))[0]
+        fcntl.ioctl(fd, FS_IOC_SETFLAGS, struct.pack("i", flags | FS_NOCOW_FL))
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _link_or_copy(src, dst):
+    """
+    Hard-links an immutable object file, copying it when linking fails.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the destination file.
+    """
+    try:
+        os.link(src, dst)
+    except OSError as error:
+        if error.errno not in LINK_UNSUPPORTED:
+            raise
+        _cow_copy(src, dst)
+
 
 class MiniGit:
     """
@@ -18,6 +388,46 @@ class MiniGit:
         self.objects_dir = os.path.join(self.repo_dir, "objects")
         self.index_file = os.path.join(self.repo_dir, "index")
         self.head_file = os.path.join(self.repo_dir, "HEAD")
+        self._hasher = hashlib.blake2b
+        self._index_buffer = []  # Staged entries not yet written to the index
+        self._index_buffer_size = 0
+        self.commit_branches_file = os.path.join(self.repo_dir, "commit_branches.idx")
+        self.stat_cache_file = os.path.join(self.repo_dir, "stat_cache.pickle")
+        self.pack_file = os.path.join(self.objects_dir, "pack.dat")
+        self.pack_index_file = os.path.join(self.objects_dir, "pack.idx")
+        self._known_objects = None  # Ids in objects/, scanned on first use
+        self._pack = None  # Packed id -> (offset, length), loaded on first use
+        self._pack_end = 0  # End of the last complete record in the pack
+        self._pack_dirty = False  # Pack has records missing from pack.idx
+        self._pack_lock = threading.Lock()  # Serializes appends to the pack
+        self._commit_branches = None  # Commit -> branches, loaded on first use
+        self._stat_cache = None  # Path -> (mtime_ns, size, inode, hash)
+        self._stat_cache_dirty = False
+        self._head_cache = None  # Current branch name, read on first use
+
+    @property
+    def current_branch(self):
+        """
+        str: Name of the checked-out branch, as recorded in `HEAD`.
+
+        `HEAD` is read once and then cached; anything that moves `HEAD`
+        must go through `_set_head` so the cache stays correct.
+        """
+        if self._head_cache is None:
+            with open(self.head_file, "r") as head:
+                self._head_cache = head.read().strip()
+        return self._head_cache
+
+    def _set_head(self, branch_name):
+        """
+        Points `HEAD` at a branch and updates the cached branch name.
+
+        Args:
+            branch_name (str): Name of the branch.
+        """
+        with open(self.head_file, "w") as head:
+            head.write(f"{branch_name}\n")
+        self._head_cache = branch_name
 
     def init(self):
         """
@@ -31,95 +441,742 @@ class MiniGit:
             return
 
         os.makedirs(self.objects_dir, exist_ok=True)
+        _disable_cow(self.objects_dir)  # Objects are never rewritten in place
         with open(self.index_file, "w") as index:
             pass  # Empty index
-        with open(self.head_file, "w") as head:
-            head.write("main\n")
+        self._set_head("main")
 
         print("Initialized empty MiniGit repository.")
 
+    def _new_hash(self, data=b""):
+        """
+        Creates a hash object for computing object ids.
+
+        Args:
+            data (bytes): Initial data to feed into the hash.
+
+        Returns:
+            A hashlib hash object with a DIGEST_SIZE-byte digest.
+        """
+        return self._hasher(data, digest_size=DIGEST_SIZE)
+
     def hash_file(self, filepath):
         """
-        Computes the SHA-1 hash of a file's content.
+        Computes the BLAKE2b hash of a file's content.
+
+        Regular files are memory-mapped and hashed straight from the page
+        cache, at most MMAP_WINDOW bytes at a time, instead of being read
+        in small chunks. Files that cannot be mapped, such as pipes, are
+        streamed into the hash instead.
 
         Args:
             filepath (str): Path to the file.
 
         Returns:
-            str: The SHA-1 hash of the file as a hexadecimal string.
+            str: The BLAKE2b hash of the file as a hexadecimal string.
         """
-        sha1 = hashlib.sha1()
         with open(filepath, "rb") as file:
-            while chunk := file.read(8192):
-                sha1.update(chunk)
-        return sha1.hexdigest()
+            file_stat = os.fstat(file.fileno())
+            size = file_stat.st_size
+            if not stat.S_ISREG(file_stat.st_mode) or size == 0:
+                # Size is unknown, or 0 as reported by e.g. /proc files
+                return self._hash_stream(file)
+
+            file_hash = self._new_hash()
+            for offset in range(0, size, MMAP_WINDOW):
+                length = min(MMAP_WINDOW, size - offset)
+                with mmap.mmap(
+                    file.fileno(), length, offset=offset, access=mmap.ACCESS_READ
+                ) as window:
+                    file_hash.update(window)
+        return file_hash.hexdigest()
+
+    def _hash_stream(self, file):
+        """
+        Computes the BLAKE2b hash of everything left in a binary file object.
+
+        Uses hashlib.file_digest where available (Python 3.11+), and
+        otherwise reads into one reused buffer so no bytes object is
+        allocated per chunk.
+
+        Args:
+            file: File object opened in binary mode.
+
+        Returns:
+            str: The BLAKE2b hash of the content as a hexadecimal string.
+        """
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(file, self._new_hash).hexdigest()
+
+        file_hash = self._new_hash()
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        while size := file.readinto(buffer):
+            file_hash.update(view[:size])
+        return file_hash.hexdigest()
 
     def add(self, filepath):
         """
         Stages a file by hashing its content and saving it as a blob.
 
-        The blob is stored in the `objects` directory, and the file
-        metadata is written to the `index`.
+        The blob is appended to the pack in the `objects` directory, and
+        the file metadata is queued for the `index`. Queued entries are
+        written out by `flush_index`, which runs automatically on commit or
+        once the queue exceeds INDEX_FLUSH_SIZE bytes. Files whose stat
+        data matches the stat cache reuse their previous hash unread.
 
         Args:
             filepath (str): Path to the file to be staged.
         """
-        if not os.path.exists(filepath):
+        entry = self._stage_one(filepath)
+        if entry is None:
             print(f"Error: File {filepath} does not exist.")
             return
 
-        file_hash = self.hash_file(filepath)
-        blob_path = os.path.join(self.objects_dir, file_hash)
+        self._queue_index_entries([entry])
+        print(f"Staged file: {filepath}")
 
-        if not os.path.exists(blob_path):
-            shutil.copy(filepath, blob_path)
+    def add_many(self, filepaths):
+        """
+        Stages several files, hashing and storing them in parallel.
 
-        with open(self.index_file, "a") as index:
-            index.write(f"{filepath} {file_hash}\n")
+        Hashing and file I/O release the GIL, so a thread pool overlaps
+        them across files. The index entries are queued together once all
+        files are staged, in the order given.
 
-        print(f"Staged file: {filepath}")
+        Args:
+            filepaths (list): Paths to the files to be staged.
+        """
+        # Load shared state up front so worker threads only read or update it
+        self._object_ids()
+        self._stat_cache_entries()
+
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            entries = list(executor.map(self._stage_one, filepaths))
+
+        staged = []
+        for filepath, entry in zip(filepaths, entries):
+            if entry is None:
+                print(f"Error: File {filepath} does not exist.")
+            else:
+                staged.append(entry)
+                print(f"Staged file: {filepath}")
+        self._queue_index_entries(staged)
+
+    def _stage_one(self, filepath):
+        """
+        Hashes a file and stores its blob, without touching the index.
+
+        Args:
+            filepath (str): Path to the file to be staged.
+
+        Returns:
+            str: The index entry for the file, or None if it does not exist.
+        """
+        try:
+            file_stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+
+        cached_hash = self._cached_hash(filepath, file_stat)
+        file_hash = cached_hash
+        if file_hash is None or file_hash not in self._object_ids():
+            file_hash = self._store_blob(filepath)
+        if file_hash != cached_hash:
+            self._cache_hash(filepath, file_stat, file_hash)
+
+        return f"{filepath} {file_hash}\n"
+
+    def _queue_index_entries(self, entries):
+        """
+        Queues index entries, flushing the queue once it grows too large.
+
+        Args:
+            entries (list): Index lines, each ending in a newline.
+        """
+        self._index_buffer.extend(entries)
+        self._index_buffer_size += sum(len(entry) for entry in entries)
+        if self._index_buffer_size > INDEX_FLUSH_SIZE:
+            self.flush_index()
+
+    def flush_index(self):
+        """
+        Appends all queued index entries to the `index` in a single write.
+
+        Also rewrites `pack.idx` and the stat cache if they have changed.
+        """
+        self._write_pack_index()
+        self._write_stat_cache()
+        if not self._index_buffer:
+            return
+
+        _append_file(self.index_file, "".join(self._index_buffer).encode())
+        self._index_buffer.clear()
+        self._index_buffer_size = 0
+
+    def _stat_cache_entries(self):
+        """
+        Returns the stat cache, loading it from disk on first use.
+
+        Returns:
+            dict: Maps file paths to (mtime_ns, size, inode, hash) tuples.
+        """
+        if self._stat_cache is None:
+            self._stat_cache = {}
+            if os.path.exists(self.stat_cache_file):
+                try:
+                    with open(self.stat_cache_file, "rb") as stat_cache:
+                        self._stat_cache = pickle.load(stat_cache)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    pass  # A damaged cache only costs re-hashing
+        return self._stat_cache
+
+    def _cached_hash(self, filepath, file_stat):
+        """
+        Looks up the hash of a file whose stat data has not changed.
+
+        Args:
+            filepath (str): Path to the file.
+            file_stat (os.stat_result): Current stat data of the file.
+
+        Returns:
+            str: The cached hash, or None if the file may have changed.
+        """
+        cached = self._stat_cache_entries().get(filepath)
+        current = (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino)
+        if cached is None or cached[:3] != current:
+            return None
+        return cached[3]
+
+    def _cache_hash(self, filepath, file_stat, file_hash):
+        """
+        Records a file's hash against its stat data.
+
+        Args:
+            filepath (str): Path to the file.
+            file_stat (os.stat_result): Stat data of the file when hashed.
+            file_hash (str): Hash of the file's content.
+        """
+        if time.time_ns() - file_stat.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        entry = (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino, file_hash)
+        self._stat_cache_entries()[filepath] = entry
+        self._stat_cache_dirty = True
+
+    def _write_stat_cache(self):
+        """
+        Saves the stat cache to disk if it has changed.
+        """
+        if not self._stat_cache_dirty:
+            return
+
+        tmp_path = self.stat_cache_file + ".tmp"
+        with open(tmp_path, "wb") as stat_cache:
+            pickle.dump(self._stat_cache, stat_cache)
+        os.replace(tmp_path, self.stat_cache_file)
+        self._stat_cache_dirty = False
+
+    def _store_blob(self, filepath):
+        """
+        Hashes a file and appends its blob to the pack.
+
+        Files below SMALL_BLOB_SIZE, typical of source code, are read with
+        a single read() call and hashed from that one bytes object, and
+        their record reaches the pack in one write. Other regular files
+        that fit in one MMAP_WINDOW are memory-mapped and hashed in a
+        single update, during which hashlib releases the GIL. Only the
+        append itself takes the pack lock, so `add_many` workers hash
+        their files in parallel. Larger files, and files that cannot be
+        mapped, are streamed by `_stream_blob`.
+
+        Args:
+            filepath (str): Path to the file to be stored.
+
+        Returns:
+            str: The BLAKE2b hash of the file as a hexadecimal string.
+        """
+        with open(filepath, "rb", buffering=0) as source:
+            file_stat = os.fstat(source.fileno())
+            regular = stat.S_ISREG(file_stat.st_mode)
+            if regular and file_stat.st_size < SMALL_BLOB_SIZE:
+                data = source.read(SMALL_BLOB_SIZE)
+                if len(data) < SMALL_BLOB_SIZE:
+                    file_hash = self._new_hash(data).hexdigest()
+                    if file_hash not in self._object_ids():
+                        self._append_pack_record(file_hash, self._encode_blob(data))
+                    return file_hash
+                source.seek(0)  # The file grew since it was stat-ed
+
+            if not regular or file_stat.st_size == 0 or file_stat.st_size > MMAP_WINDOW:
+                return self._stream_blob(filepath, source)
+
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                file_hash = self._new_hash(data).hexdigest()
+                if file_hash not in self._object_ids():
+                    self._append_pack_record(file_hash, self._encode_blob(data))
+        return file_hash
+
+    def _encode_blob(self, data):
+        """
+        Prepares blob content for storage in a pack record.
+
+        When zstandard is installed, blobs of at least COMPRESS_MIN_SIZE
+        bytes are compressed; the record then holds ZSTD_MAGIC, the raw
+        length as a varint and a zstd frame.
+
+        Args:
+            data (bytes): Raw blob content, or any buffer holding it.
+
+        Returns:
+            list: Byte strings that make up the record data, in order.
+        """
+        if zstandard is None or len(data) < COMPRESS_MIN_SIZE:
+            return [data]
+        compressor = _zstd_compressor(len(data))
+        return [ZSTD_MAGIC + _encode_varint(len(data)), compressor.compress(data)]
+
+    def _open_pack(self):
+        """
+        Opens `pack.dat` for reading and writing, creating it if needed.
+
+        Returns:
+            A binary file object positioned at the start of the pack.
+        """
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        return open(os.open(self.pack_file, flags, 0o644), "r+b")
+
+    @contextmanager
+    def _locked_pack(self):
+        """
+        Opens the pack with exclusive access for appending to it.
+
+        Threads are serialized by the pack lock and other processes by an
+        flock on `pack.dat` (where fcntl is available). Once the lock is
+        held, records other processes appended since this instance last
+        looked are picked up, so `_pack_end` is the real end of the pack.
+
+        Yields:
+            The pack opened as by `_open_pack`.
+        """
+        with self._pack_lock:
+            self._pack_entries()
+            with self._open_pack() as pack:
+                if fcntl is not None:
+                    fcntl.flock(pack.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._pack_end = self._scan_pack(pack, self._pack_end)
+                    yield pack
+                finally:
+                    pack.flush()
+                    if fcntl is not None:
+                        fcntl.flock(pack.fileno(), fcntl.LOCK_UN)
+
+    def _append_pack_record(self, file_hash, chunks):
+        """
+        Appends a complete record to the pack, unless the blob is stored.
+
+        Args:
+            file_hash (str): Hash of the blob's raw content.
+            chunks (list): Byte strings that make up the record data.
+        """
+        with self._locked_pack() as pack:
+            known_objects = self._object_ids()
+            if file_hash in known_objects:
+                return
+
+            offset = self._pack_end
+            length = sum(len(chunk) for chunk in chunks)
+            pack.seek(offset)
+            pack.write(PACK_RECORD.pack(bytes.fromhex(file_hash), length))
+            for chunk in chunks:
+                pack.write(chunk)
+            self._pack_end = offset + PACK_RECORD.size + length
+            pack.truncate(self._pack_end)
+
+            self._pack[file_hash] = (offset + PACK_RECORD.size, length)
+            known_objects.add(file_hash)
+            self._pack_dirty = True
+
+    def _stream_blob(self, filepath, source):
+        """
+        Hashes a file and appends its blob to the pack in a single pass.
+
+        The content is streamed in chunks into both the hash and a new
+        pack record, compressed as in `_encode_blob`. Once the hash is
+        known it is written into the record header, or the record is cut
+        off again if that blob is already stored. The pack stays locked
+        throughout.
+
+        Args:
+            filepath (str): Path to the file to be stored.
+            source: The file, opened in binary mode.
+
+        Returns:
+            str: The BLAKE2b hash of the file as a hexadecimal string.
+        """
+        with self._locked_pack() as pack:
+            offset = self._pack_end
+            content_hash = self._new_hash()
+            buffer = bytearray(CHUNK_SIZE)
+            view = memoryview(buffer)
+
+            raw_size = os.fstat(source.fileno()).st_size
+            compressor = None
+            if zstandard is not None and raw_size >= COMPRESS_MIN_SIZE:
+                compressor = _zstd_compressor(raw_size).compressobj(size=raw_size)
+
+            pack.seek(offset)
+            pack.write(PACK_RECORD.pack(bytes(DIGEST_SIZE), PACK_PENDING_LENGTH))
+            if compressor is not None:
+                pack.write(ZSTD_MAGIC + _encode_varint(raw_size))
+            read_size = 0
+            while size := source.readinto(buffer):
+                content_hash.update(view[:size])
+                read_size += size
+                if compressor is not None:
+                    pack.write(compressor.compress(view[:size]))
+                else:
+                    pack.write(view[:size])
+            if compressor is not None:
+                if read_size != raw_size:
+                    pack.truncate(self._pack_end)
+                    raise RuntimeError(f"{filepath} changed while it was being staged.")
+                pack.write(compressor.flush())
+            length = pack.tell() - offset - PACK_RECORD.size
+            file_hash = content_hash.hexdigest()
+
+            known_objects = self._object_ids()
+            if file_hash not in known_objects:
+                pack.seek(offset)
+                pack.write(PACK_RECORD.pack(bytes.fromhex(file_hash), length))
+                self._pack[file_hash] = (offset + PACK_RECORD.size, length)
+                known_objects.add(file_hash)
+                self._pack_end = offset + PACK_RECORD.size + length
+                self._pack_dirty = True
+            pack.truncate(self._pack_end)
+        return file_hash
+
+    def _pack_entries(self):
+        """
+        Returns the location of every blob stored in the pack.
+
+        Entries come from `pack.idx`, plus any complete records appended to
+        `pack.dat` after the index was last written.
+
+        Returns:
+            dict: Maps object ids to (data offset, data length) tuples.
+        """
+        if self._pack is not None:
+            return self._pack
+
+        self._pack = {}
+        end = 0
+        if os.path.exists(self.pack_index_file):
+            with open(self.pack_index_file, "rb") as pack_index:
+                data = pack_index.read()
+            for digest, offset, length in PACK_INDEX_ENTRY.iter_unpack(data):
+                self._pack[digest.hex()] = (offset, length)
+                end = max(end, offset + length)
+
+        if os.path.exists(self.pack_file):
+            with open(self.pack_file, "rb") as pack:
+                end = self._scan_pack(pack, end)
+
+        self._pack_end = end
+        return self._pack
+
+    def _scan_pack(self, pack, end):
+        """
+        Records every complete pack record from an offset onwards.
+
+        Args:
+            pack: The pack, opened in binary mode.
+            end (int): Offset of the first record to read.
+
+        Returns:
+            int: Offset just past the last complete record.
+        """
+        pack_size = pack.seek(0, os.SEEK_END)
+        while end + PACK_RECORD.size <= pack_size:
+            pack.seek(end)
+            digest, length = PACK_RECORD.unpack(pack.read(PACK_RECORD.size))
+            if end + PACK_RECORD.size + length > pack_size:
+                break  # Record was never completed
+            object_id = digest.hex()
+            self._pack[object_id] = (end + PACK_RECORD.size, length)
+            if self._known_objects is not None:
+                self._known_objects.add(object_id)
+            self._pack_dirty = True
+            end += PACK_RECORD.size + length
+        return end
+
+    def _write_pack_index(self):
+        """
+        Rewrites `pack.idx` as entries sorted by object id.
+
+        The sorted layout lets readers binary-search the file by id. The
+        pack is locked while the index is rewritten, and entries another
+        process wrote to `pack.idx` in the meantime are kept.
+        """
+        if not self._pack_dirty:
+            return
+
+        with self._locked_pack():
+            if os.path.exists(self.pack_index_file):
+                with open(self.pack_index_file, "rb") as pack_index:
+                    data = pack_index.read()
+                for digest, offset, length in PACK_INDEX_ENTRY.iter_unpack(data):
+                    self._pack.setdefault(digest.hex(), (offset, length))
+
+            entries = b"".join(
+                PACK_INDEX_ENTRY.pack(bytes.fromhex(object_id), *self._pack[object_id])
+                for object_id in sorted(self._pack)
+            )
+            tmp_path = self.pack_index_file + ".tmp"
+            with open(tmp_path, "wb") as pack_index:
+                pack_index.write(entries)
+            os.replace(tmp_path, self.pack_index_file)
+            self._pack_dirty = False
+
+    def read_object(self, object_id):
+        """
+        Reads the content of a stored object.
+
+        Packed records that start with ZSTD_MAGIC are decompressed, unless
+        the record hashes to the object id itself, which means it is an
+        uncompressed blob that happens to start with those bytes.
+
+        Args:
+            object_id (str): Hash of the object as a hexadecimal string.
+
+        Returns:
+            bytes: The object's content.
+
+        Raises:
+            RuntimeError: If the object is compressed and zstandard is not
+                installed.
+        """
+        location = self._pack_entries().get(object_id)
+        if location is None:
+            with open(os.path.join(self.objects_dir, object_id), "rb") as loose:
+                return loose.read()
+
+        offset, length = location
+        with open(self.pack_file, "rb") as pack:
+            pack.seek(offset)
+            data = pack.read(length)
+
+        if not data.startswith(ZSTD_MAGIC) or self._new_hash(data).hexdigest() == object_id:
+            return data
+        if zstandard is None:
+            raise RuntimeError(f"Object {object_id} is compressed and needs zstandard.")
+
+        raw_size, start = _decode_varint(data, len(ZSTD_MAGIC))
+        decompressor = zstandard.ZstdDecompressor()
+        return decompressor.decompress(data[start:], max_output_size=raw_size)
+
+    def _object_ids(self):
+        """
+        Returns the ids of the objects stored in the `objects` directory.
+
+        The directory and the pack are scanned once and the set is kept up
+        to date as objects are written, so existence checks need no stat
+        call.
+
+        Returns:
+            set: Object ids as hexadecimal strings.
+        """
+        if self._known_objects is None:
+            self._known_objects = set()
+            if os.path.isdir(self.objects_dir):
+                with os.scandir(self.objects_dir) as entries:
+                    self._known_objects = {entry.name for entry in entries}
+            self._known_objects.update(self._pack_entries())
+        return self._known_objects
 
     def commit(self, message):
         """
         Creates a new commit from the staged files in the index.
 
+        The commit object, the refs entry and each log entry are written
+        with one write call apiece, and the index is cleared by truncating
+        it in place. The commit id is the hash of the whole commit object,
+        message included, so an id that is already stored names exactly
+        this content and the object is not rewritten.
+
+        Files staged more than once are recorded with their latest hash
+        only, and entries are sorted by path, so the same staged state and
+        message always produce the same commit hash.
+
         Args:
             message (str): Commit message describing the changes.
         """
-        if not os.path.exists(self.index_file) or os.path.getsize(self.index_file) == 0:
+        index_content = b""
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "rb") as index:
+                index_content = index.read()
+        index_content += "".join(self._index_buffer).encode()
+
+        if not index_content:
             print("Error: No changes to commit.")
             return
 
-        with open(self.index_file, "r") as index:
-            index_content = index.read()
+        index_content = self._canonical_index(index_content)
+        commit_content = f"Message: {message}\n".encode() + index_content
+
+        commit_hash = self._new_hash(commit_content).hexdigest()
+        known_objects = self._object_ids()
+        if commit_hash not in known_objects:
+            commit_path = os.path.join(self.objects_dir, commit_hash)
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+            fd = os.open(commit_path, flags, 0o444)
+            try:
+                os.write(fd, commit_content)
+            finally:
+                os.close(fd)
+            known_objects.add(commit_hash)
+        self._write_pack_index()
+        self._write_stat_cache()
+
+        branch_name = self.current_branch
+        branch_path = os.path.join(self.repo_dir, f"refs_{branch_name}.txt")
+
+        branch_log_path = self._branch_log_path(branch_name)
+        if os.path.exists(branch_path) and not os.path.exists(branch_log_path):
+            self._seed_branch_log(branch_path, branch_log_path)
 
-        commit_hash = hashlib.sha1(index_content.encode()).hexdigest()
-        commit_path = os.path.join(self.objects_dir, commit_hash)
+        if not os.path.exists(self.commit_branches_file):
+            self._seed_reverse_index()
 
-        with open(commit_path, "w") as commit_file:
-            commit_file.write(f"Message: {message}\n")
-            commit_file.write(index_content)
+        _append_file(branch_path, commit_hash.encode(), b"\n")
 
-        with open(self.head_file, "r+") as head:
-            branch_name = head.read().strip()
-            branch_path = os.path.join(self.repo_dir, f"refs_{branch_name}.txt")
+        # Keep the message next to the ref so log need not open commits
+        summary = (message.splitlines() or [""])[0]
+        _append_file(branch_log_path, f"{commit_hash} {summary}\n".encode())
 
-            with open(branch_path, "a") as branch_file:
-                branch_file.write(f"{commit_hash}\n")
+        self._update_reverse_index(commit_hash, branch_name)
 
-        with open(self.index_file, "w") as index:  # Clear the index
-            pass
+        try:
+            os.truncate(self.index_file, 0)  # Clear the index
+        except FileNotFoundError:
+            open(self.index_file, "wb").close()
+        self._index_buffer.clear()
+        self._index_buffer_size = 0
 
         print(f"Committed changes with hash: {commit_hash}")
 
-    def log(self):
+    def _seed_branch_log(self, branch_path, branch_log_path):
+        """
+        Creates a branch's commit log from its existing commits.
+
+        Branches committed to before commit logs existed only have a refs
+        file; their messages are read from the commit objects once, so the
+        log covers the whole history from then on.
+
+        Args:
+            branch_path (str): Path to the branch's refs file.
+            branch_log_path (str): Path of the commit log to create.
+        """
+        entries = []
+        with open(branch_path, "r") as branch_file:
+            for commit_hash in branch_file:
+                commit_hash = commit_hash.strip()
+                commit_path = os.path.join(self.objects_dir, commit_hash)
+                with open(commit_path, "r") as commit_file:
+                    message = commit_file.readline().strip()
+                entries.append(f"{commit_hash} {message.removeprefix('Message: ')}\n")
+        _append_file(branch_log_path, "".join(entries).encode())
+
+    def _canonical_index(self, index_content):
+        """
+        Collapses index entries to one per path, sorted by path.
+
+        Args:
+            index_content (bytes): Raw index lines of the form "<path> <hash>".
+
+        Returns:
+            bytes: The deduplicated, sorted index lines.
+        """
+        entries = {}
+        for line in index_content.decode().splitlines():
+            path, _, file_hash = line.rpartition(" ")
+            entries[path] = file_hash  # Later stagings win
+        return "".join(f"{path} {entries[path]}\n" for path in sorted(entries)).encode()
+
+    def _update_reverse_index(self, commit_hash, branch_name):
+        """
+        Records that a branch contains a commit in `commit_branches.idx`.
+
+        Args:
+            commit_hash (str): Hash of the commit.
+            branch_name (str): Name of the branch the commit was added to.
+        """
+        _append_file(self.commit_branches_file, f"{commit_hash} {branch_name}\n".encode())
+
+        if self._commit_branches is not None:
+            branches = self._commit_branches.setdefault(commit_hash, [])
+            if branch_name not in branches:
+                branches.append(branch_name)
+
+    def _seed_reverse_index(self):
+        """
+        Creates `commit_branches.idx` from every branch's refs file.
+
+        Repositories committed to before the reverse index existed only have
+        refs files, so their commits are indexed once on first use.
+        """
+        entries = []
+        for file_name in sorted(os.listdir(self.repo_dir)):
+            if not (file_name.startswith("refs_") and file_name.endswith(".txt")):
+                continue
+            branch_name = file_name[len("refs_"):-len(".txt")]
+            with open(os.path.join(self.repo_dir, file_name), "r") as branch_file:
+                for commit_hash in branch_file:
+                    entries.append(f"{commit_hash.strip()} {branch_name}\n")
+        _append_file(self.commit_branches_file, "".join(entries).encode())
+        self._commit_branches = None
+
+    def branches_for(self, commit_hash):
+        """
+        Lists the branches that contain a commit.
+
+        Uses `commit_branches.idx` instead of scanning every branch's refs.
+
+        Args:
+            commit_hash (str): Hash of the commit.
+
+        Returns:
+            list: Names of the branches containing the commit.
+        """
+        if self._commit_branches is None:
+            if not os.path.exists(self.commit_branches_file):
+                self._seed_reverse_index()
+            self._commit_branches = {}
+            with open(self.commit_branches_file, "r") as reverse_index:
+                for line in reverse_index:
+                    entry_hash, _, branch_name = line.rstrip("\n").partition(" ")
+                    branches = self._commit_branches.setdefault(entry_hash, [])
+                    if branch_name not in branches:
+                        branches.append(branch_name)
+
+        return list(self._commit_branches.get(commit_hash, []))
+
+    def log(self, last=None):
         """
         Displays the commit history of the current branch.
 
-        Prints each commit hash and its associated message.
+        Prints each commit hash and its associated message. Messages are
+        read from the branch's commit log in one go; repositories created
+        before that log existed fall back to opening each commit object.
+
+        Args:
+            last (int): If given, only the most recent `last` commits are
+                shown. They are read from the end of the commit log (or of
+                the refs file), so the cost does not grow with the length
+                of the history.
         """
-        with open(self.head_file, "r") as head:
-            branch_name = head.read().strip()
+        branch_name = self.current_branch
         branch_path = os.path.join(self.repo_dir, f"refs_{branch_name}.txt")
 
         if not os.path.exists(branch_path):
@@ -127,14 +1184,91 @@ class MiniGit:
             return
 
         print("Commit history:")
-        with open(branch_path, "r") as branch_file:
-            for commit_hash in branch_file:
-                commit_hash = commit_hash.strip()
-                commit_path = os.path.join(self.objects_dir, commit_hash)
+        branch_log_path = self._branch_log_path(branch_name)
+        if os.path.exists(branch_log_path):
+            if last is not None:
+                entries = self._last_log_entries(branch_log_path, last)
+            else:
+                # Entries end in "\n" only; other line breaks are not separators
+                with open(branch_log_path, "r", newline="") as branch_log:
+                    entries = branch_log.read().split("\n")[:-1]
+            for entry in entries:
+                commit_hash, _, message = entry.partition(" ")
+                print(f"{commit_hash} - Message: {message}")
+            return
 
-                with open(commit_path, "r") as commit_file:
-                    message = commit_file.readline().strip()
-                    print(f"{commit_hash} - {message}")
+        if last is not None:
+            commit_hashes = self._last_commits(branch_path, last)
+        else:
+            with open(branch_path, "r") as branch_file:
+                commit_hashes = [commit_hash.strip() for commit_hash in branch_file]
+
+        for commit_hash in commit_hashes:
+            commit_path = os.path.join(self.objects_dir, commit_hash)
+            with open(commit_path, "r") as commit_file:
+                message = commit_file.readline().strip()
+                print(f"{commit_hash} - {message}")
+
+    def _last_log_entries(self, branch_log_path, count):
+        """
+        Reads the most recent entries from a branch's commit log.
+
+        Entries vary in length, so the file is read backwards in blocks
+        until enough lines have been seen.
+
+        Args:
+            branch_log_path (str): Path to the branch's commit log.
+            count (int): Number of entries to read.
+
+        Returns:
+            list: Log lines, oldest first.
+        """
+        if count <= 0:
+            return []
+        with open(branch_log_path, "rb") as branch_log:
+            position = branch_log.seek(0, os.SEEK_END)
+            tail = b""
+            # The final newline ends the last entry, so one more is needed
+            while position > 0 and tail.count(b"\n") <= count:
+                step = min(LOG_TAIL_BLOCK, position)
+                position -= step
+                branch_log.seek(position)
+                tail = branch_log.read(step) + tail
+        # The first line may start mid-character, so decode only whole lines
+        lines = tail.split(b"\n")[:-1]
+        return [line.decode() for line in lines[-count:]]
+
+    def _last_commits(self, branch_path, count):
+        """
+        Reads the most recent commit hashes from a refs file.
+
+        Every entry is a hash of fixed width plus a newline, so the last
+        `count` entries are located by offset from the end of the file.
+
+        Args:
+            branch_path (str): Path to the branch's refs file.
+            count (int): Number of commits to read.
+
+        Returns:
+            list: Commit hashes, oldest first.
+        """
+        with open(branch_path, "rb") as branch_file:
+            size = branch_file.seek(0, os.SEEK_END)
+            length = min(max(count, 0) * REF_ENTRY_SIZE, size)
+            branch_file.seek(size - length)
+            return branch_file.read(length).decode().split()
+
+    def _branch_log_path(self, branch_name):
+        """
+        Returns the path of the file listing a branch's commits and messages.
+
+        Args:
+            branch_name (str): Name of the branch.
+
+        Returns:
+            str: Path to `refs_<branch>.log`.
+        """
+        return os.path.join(self.repo_dir, f"refs_{branch_name}.log")
 
     def clone(self, target_dir):
         """
@@ -147,14 +1281,50 @@ class MiniGit:
             print(f"Error: Directory {target_dir} already exists.")
             return
 
-        shutil.copytree(self.repo_dir, os.path.join(target_dir, ".minigit"))
+        self.flush_index()
+        _cow_copytree(
+            self.repo_dir,
+            os.path.join(target_dir, ".minigit"),
+            copy_function=self._clone_file,
+        )
         print(f"Cloned repository into {target_dir}")
 
+    def _clone_file(self, src, dst):
+        """
+        Copies one repository file into a clone.
+
+        Loose objects are content-addressed and never modified, so they
+        are hard-linked into the clone; every other file, including the
+        pack that later blobs are appended to, is copied as a
+        copy-on-write clone where possible.
+
+        Args:
+            src (str): Path to the file in this repository.
+            dst (str): Path to the file in the clone.
+        """
+        if os.path.dirname(src) == self.objects_dir and self._is_object_id(
+            os.path.basename(src)
+        ):
+            _link_or_copy(src, dst)
+        else:
+            _cow_copy(src, dst)
+
+    @staticmethod
+    def _is_object_id(name):
+        """
+        Checks whether a file name is a hexadecimal object id.
+
+        Args:
+            name (str): File name to check.
+
+        Returns:
+            bool: True if the name is an object id.
+        """
+        return len(name) == 2 * DIGEST_SIZE and all(c in "0123456789abcdef" for c in name)
+
 
 # Main execution block
 if __name__ == "__main__":
-    import sys
-
     mini_git = MiniGit()
 
     if len(sys.argv) < 2:
@@ -167,10 +1337,21 @@ if __name__ == "__main__":
         mini_git.init()
     elif command == "add" and len(sys.argv) == 3:
         mini_git.add(sys.argv[2])
+        mini_git.flush_index()
+    elif command == "add" and len(sys.argv) > 3:
+        mini_git.add_many(sys.argv[2:])
+        mini_git.flush_index()
     elif command == "commit" and len(sys.argv) == 3:
         mini_git.commit(sys.argv[2])
-    elif command == "log":
+    elif command == "log" and len(sys.argv) == 2:
         mini_git.log()
+    elif (
+        command == "log"
+        and len(sys.argv) == 4
+        and sys.argv[2] == "--last"
+        and sys.argv[3].isdecimal()
+    ):
+        mini_git.log(int(sys.argv[3]))
     elif command == "clone" and len(sys.argv) == 3:
         mini_git.clone(sys.argv[2])
     else:
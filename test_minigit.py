@@ -1,7 +1,15 @@
 import os
+import sys
 import shutil
+import hashlib
+import io
+import struct
+import threading
+import mmap
+import subprocess
 import pytest
-from minigit import MiniGit
+import minigit
+from minigit import MiniGit, _cow_copytree, _kernel_copy
 
 
 @pytest.fixture
@@ -44,6 +52,19 @@ def test_init_creates_repository(setup_minigit):
     assert os.path.isfile(setup_minigit.head_file)
 
 
+def test_current_branch_is_cached(setup_minigit):
+    """
+    Tests that the current branch is read from HEAD once and then cached.
+    """
+    assert setup_minigit.current_branch == "main"
+
+    with open(setup_minigit.head_file, "w") as head:
+        head.write("other\n")
+
+    assert setup_minigit.current_branch == "main"
+    assert MiniGit().current_branch == "other"
+
+
 def test_add_stages_file(setup_minigit):
     """
     Tests that a file is correctly staged.
@@ -51,6 +72,7 @@ def test_add_stages_file(setup_minigit):
     filename = "file1.txt"
     create_test_file(filename)
     setup_minigit.add(filename)
+    setup_minigit.flush_index()
 
     with open(setup_minigit.index_file, "r") as index:
         staged_files = index.read()
@@ -58,6 +80,269 @@ def test_add_stages_file(setup_minigit):
     assert filename in staged_files
 
 
+def test_add_buffers_index_until_commit(setup_minigit):
+    """
+    Tests that staged entries are held in memory and still reach the commit.
+    """
+    filename = "file1.txt"
+    create_test_file(filename)
+    setup_minigit.add(filename)
+
+    assert os.path.getsize(setup_minigit.index_file) == 0
+
+    setup_minigit.commit("Initial commit")
+
+    with open(setup_minigit.head_file, "r") as head:
+        branch = head.read().strip()
+    with open(os.path.join(".minigit", f"refs_{branch}.txt"), "r") as branch_file:
+        commit_hash = branch_file.read().strip()
+    with open(os.path.join(setup_minigit.objects_dir, commit_hash), "r") as commit_file:
+        assert filename in commit_file.read()
+
+
+def test_hash_file_uses_blake2b(setup_minigit):
+    """
+    Tests that file hashes are 40-character BLAKE2b digests of the content.
+    """
+    filename = "file1.txt"
+    create_test_file(filename)
+
+    expected = hashlib.blake2b(b"Test content", digest_size=20).hexdigest()
+    assert setup_minigit.hash_file(filename) == expected
+    assert len(expected) == 40
+
+
+def test_hash_file_empty_file(setup_minigit):
+    """
+    Tests that an empty file hashes to the digest of no content.
+    """
+    filename = "empty.txt"
+    create_test_file(filename, "")
+
+    expected = hashlib.blake2b(b"", digest_size=20).hexdigest()
+    assert setup_minigit.hash_file(filename) == expected
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_hash_file_streams_pipes(setup_minigit):
+    """
+    Tests that files which cannot be memory-mapped are hashed by streaming.
+    """
+    os.mkfifo("pipe")
+
+    def write_pipe():
+        with open("pipe", "wb") as pipe:
+            pipe.write(b"Piped content")
+
+    writer = threading.Thread(target=write_pipe)
+    writer.start()
+    file_hash = setup_minigit.hash_file("pipe")
+    writer.join()
+
+    assert file_hash == hashlib.blake2b(b"Piped content", digest_size=20).hexdigest()
+
+
+def test_add_stores_blob_content(setup_minigit):
+    """
+    Tests that the staged blob holds an exact copy of the file content.
+    """
+    filename = "file1.txt"
+    create_test_file(filename, "Blob content")
+    setup_minigit.add(filename)
+
+    file_hash = setup_minigit.hash_file(filename)
+    assert setup_minigit.read_object(file_hash) == b"Blob content"
+
+
+def test_add_same_content_stores_one_blob(setup_minigit):
+    """
+    Tests that staging identical content twice leaves a single blob behind.
+    """
+    create_test_file("file1.txt")
+    create_test_file("file2.txt")
+    setup_minigit.add("file1.txt")
+    setup_minigit.add("file2.txt")
+
+    record_size = minigit.PACK_RECORD.size + len("Test content")
+    assert os.path.getsize(setup_minigit.pack_file) == record_size
+    assert list(setup_minigit._pack_entries()) == [setup_minigit.hash_file("file1.txt")]
+
+
+def test_pack_survives_interleaved_instances(setup_minigit):
+    """
+    Tests that two instances staging into one pack, as two add processes
+    would, keep each other's blobs.
+    """
+    create_test_file("a.txt", "From first")
+    create_test_file("b.txt", "From second")
+    first, second = MiniGit(), MiniGit()
+    first._object_ids()
+    second._object_ids()
+
+    first.add("a.txt")
+    second.add("b.txt")
+    create_test_file("c.txt", "From first again" * 500)
+    first.add("c.txt")
+    first.flush_index()
+    second.flush_index()
+
+    reopened = MiniGit()
+    for filename in ("a.txt", "b.txt", "c.txt"):
+        with open(filename, "rb") as file:
+            assert reopened.read_object(reopened.hash_file(filename)) == file.read()
+
+    with open(reopened.pack_index_file, "rb") as pack_index:
+        data = pack_index.read()
+    assert len(data) == 3 * minigit.PACK_INDEX_ENTRY.size
+
+
+def test_compressed_blob_round_trips(setup_minigit):
+    """
+    Tests that large blobs are compressed in the pack and read back intact.
+    """
+    pytest.importorskip("zstandard")
+    content = "Compressible content\n" * 1000
+    create_test_file("file1.txt", content)
+    setup_minigit.add("file1.txt")
+
+    assert os.path.getsize(setup_minigit.pack_file) < len(content)
+    file_hash = setup_minigit.hash_file("file1.txt")
+    assert setup_minigit.read_object(file_hash) == content.encode()
+
+
+def test_small_blobs_compress_without_threads(setup_minigit, monkeypatch):
+    """
+    Tests that zstd worker threads are only requested for large blobs.
+    """
+    zstandard = pytest.importorskip("zstandard")
+    requested = []
+    real_compressor = zstandard.ZstdCompressor
+
+    def recording_compressor(**kwargs):
+        requested.append(kwargs["threads"])
+        return real_compressor(**kwargs)
+
+    monkeypatch.setattr(zstandard, "ZstdCompressor", recording_compressor)
+    monkeypatch.setattr(minigit, "COMPRESS_THREADS_MIN_SIZE", 8192)
+    create_test_file("small.txt", "Small content\n" * 100)
+    create_test_file("large.txt", "Large content\n" * 1000)
+    setup_minigit.add("small.txt")
+    setup_minigit.add("large.txt")
+
+    assert requested == [0, -1]
+    for filename in ("small.txt", "large.txt"):
+        with open(filename, "rb") as source:
+            content = source.read()
+        file_hash = setup_minigit.hash_file(filename)
+        assert setup_minigit.read_object(file_hash) == content
+
+
+def test_streamed_blob_round_trips(setup_minigit, monkeypatch):
+    """
+    Tests that blobs too large to map in one window are streamed into the pack.
+    """
+    monkeypatch.setattr(minigit, "MMAP_WINDOW", mmap.ALLOCATIONGRANULARITY)
+    content = "Streamed content\n" * 1000
+    create_test_file("file1.txt", content)
+    setup_minigit.add("file1.txt")
+    setup_minigit.add("file1.txt")
+
+    file_hash = setup_minigit.hash_file("file1.txt")
+    assert list(setup_minigit._pack_entries()) == [file_hash]
+    assert setup_minigit.read_object(file_hash) == content.encode()
+
+
+def test_blobs_around_small_file_limit_round_trip(setup_minigit):
+    """
+    Tests that blobs either side of the small-file limit are stored intact.
+    """
+    for size in (minigit.SMALL_BLOB_SIZE - 1, minigit.SMALL_BLOB_SIZE):
+        content = "s" * size
+        create_test_file("file1.txt", content)
+        setup_minigit.add("file1.txt")
+
+        file_hash = setup_minigit.hash_file("file1.txt")
+        assert setup_minigit.read_object(file_hash) == content.encode()
+
+
+def test_raw_blob_with_compression_prefix(setup_minigit):
+    """
+    Tests that an uncompressed blob starting with the zstd prefix reads back as is.
+    """
+    content = "zstd1\0" + "x" * 10
+    create_test_file("file1.txt", content)
+    setup_minigit.add("file1.txt")
+
+    file_hash = setup_minigit.hash_file("file1.txt")
+    assert setup_minigit.read_object(file_hash) == content.encode()
+
+
+def test_pack_index_lists_packed_blobs(setup_minigit):
+    """
+    Tests that packed blobs are found from pack.idx and from unindexed records.
+    """
+    create_test_file("file1.txt", "First")
+    create_test_file("file2.txt", "Second")
+    setup_minigit.add("file1.txt")
+    setup_minigit.flush_index()
+    setup_minigit.add("file2.txt")
+
+    reopened = MiniGit()
+    assert reopened.read_object(reopened.hash_file("file1.txt")) == b"First"
+    assert reopened.read_object(reopened.hash_file("file2.txt")) == b"Second"
+    assert os.path.getsize(reopened.pack_index_file) == minigit.PACK_INDEX_ENTRY.size
+
+
+def test_add_tracks_known_objects(setup_minigit):
+    """
+    Tests that objects already on disk are known and new blobs are recorded.
+    """
+    create_test_file("file1.txt", "First")
+    setup_minigit.add("file1.txt")
+
+    reopened = MiniGit()
+    assert setup_minigit.hash_file("file1.txt") in reopened._object_ids()
+
+    create_test_file("file2.txt", "Second")
+    reopened.add("file2.txt")
+    assert reopened.hash_file("file2.txt") in reopened._object_ids()
+
+
+def test_add_reuses_hash_of_unchanged_file(setup_minigit, monkeypatch):
+    """
+    Tests that re-adding an unchanged file skips hashing it again.
+    """
+    filename = "file1.txt"
+    create_test_file(filename)
+    os.utime(filename, (1_000_000_000, 1_000_000_000))
+    setup_minigit.add(filename)
+    setup_minigit.commit("Initial commit")
+
+    reopened = MiniGit()
+    monkeypatch.setattr(reopened, "_store_blob", lambda filepath: pytest.fail("re-hashed"))
+    reopened.add(filename)
+
+    assert os.path.exists(reopened.stat_cache_file)
+
+
+def test_add_many_stages_all_files(setup_minigit, capsys):
+    """
+    Tests that add_many stores every blob and queues entries in order.
+    """
+    filenames = [f"file{number}.txt" for number in range(8)]
+    for number, filename in enumerate(filenames):
+        create_test_file(filename, f"Content {number % 4}")
+
+    setup_minigit.add_many(filenames + ["nonexistent.txt"])
+    setup_minigit.flush_index()
+
+    with open(setup_minigit.index_file, "r") as index:
+        staged = [line.split()[0] for line in index.read().splitlines()]
+    assert staged == filenames
+    assert len(setup_minigit._pack_entries()) == 4
+    assert "Error: File nonexistent.txt does not exist." in capsys.readouterr().out
+
+
 def test_commit_creates_commit_object(setup_minigit):
     """
     Tests that committing creates a commit object in the objects directory.
@@ -71,6 +356,69 @@ def test_commit_creates_commit_object(setup_minigit):
     assert len(objects) > 0
 
 
+def test_commit_clears_index_and_keeps_objects_read_only(setup_minigit):
+    """
+    Tests that committing empties the index and stores a read-only commit object.
+    """
+    create_test_file("file1.txt")
+    setup_minigit.add("file1.txt")
+    setup_minigit.flush_index()
+    setup_minigit.commit("Initial commit")
+
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        commit_hash = branch_file.read().strip()
+    commit_path = os.path.join(setup_minigit.objects_dir, commit_hash)
+
+    assert os.path.getsize(setup_minigit.index_file) == 0
+    assert os.stat(commit_path).st_mode & 0o222 == 0
+    assert setup_minigit.read_object(commit_hash).startswith(b"Message: Initial commit\n")
+
+
+def test_repeat_commit_keeps_each_message(setup_minigit, capsys):
+    """
+    Tests that committing the same state twice stores both messages.
+    """
+    create_test_file("file1.txt")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("first message")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("second message")
+    capsys.readouterr()
+
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        commit_hashes = branch_file.read().split()
+    second_commit = setup_minigit.read_object(commit_hashes[1])
+    assert len(set(commit_hashes)) == 2
+    assert second_commit.startswith(b"Message: second message\n")
+
+    setup_minigit.log(last=2)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].endswith(" - Message: first message")
+    assert lines[2].endswith(" - Message: second message")
+
+
+def test_commit_deduplicates_index_entries(setup_minigit):
+    """
+    Tests that re-staged files appear once in the commit, with their latest hash.
+    """
+    create_test_file("file2.txt", "Other")
+    create_test_file("file1.txt", "First")
+    setup_minigit.add("file2.txt")
+    setup_minigit.add("file1.txt")
+    create_test_file("file1.txt", "Second")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("Initial commit")
+
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        commit_hash = branch_file.read().strip()
+    lines = setup_minigit.read_object(commit_hash).decode().splitlines()
+
+    assert lines[1:] == [
+        f"file1.txt {setup_minigit.hash_file('file1.txt')}",
+        f"file2.txt {setup_minigit.hash_file('file2.txt')}",
+    ]
+
+
 def test_log_shows_commit_history(setup_minigit):
     """
     Tests that the log command displays the commit history.
@@ -92,6 +440,187 @@ def test_log_shows_commit_history(setup_minigit):
     assert len(commit_hashes) > 0
 
 
+def test_log_prints_messages_from_branch_log(setup_minigit, capsys):
+    """
+    Tests that log prints every commit and message from the branch log.
+    """
+    create_test_file("file1.txt", "First")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("First commit")
+    create_test_file("file1.txt", "Second")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("Second commit")
+    capsys.readouterr()
+
+    setup_minigit.log()
+    lines = capsys.readouterr().out.splitlines()
+
+    assert lines[0] == "Commit history:"
+    assert lines[1].endswith(" - Message: First commit")
+    assert lines[2].endswith(" - Message: Second commit")
+    assert os.path.exists(os.path.join(".minigit", "refs_main.log"))
+
+
+def test_branches_for_commit(setup_minigit):
+    """
+    Tests that the reverse index maps a commit to the branch it was made on.
+    """
+    create_test_file("file1.txt")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("Initial commit")
+
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        commit_hash = branch_file.read().strip()
+
+    assert MiniGit().branches_for(commit_hash) == ["main"]
+    assert setup_minigit.branches_for("0" * 40) == []
+
+
+def test_branches_for_covers_commits_made_before_reverse_index(setup_minigit):
+    """
+    Tests that a repository without a reverse index still maps its old commits.
+    """
+    create_test_file("file1.txt", "Version 0")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("old commit")
+    os.remove(os.path.join(".minigit", "commit_branches.idx"))
+
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        old_hash = branch_file.read().strip()
+    assert MiniGit().branches_for(old_hash) == ["main"]
+
+    os.remove(os.path.join(".minigit", "commit_branches.idx"))
+    upgraded = MiniGit()
+    create_test_file("file1.txt", "Version 1")
+    upgraded.add("file1.txt")
+    upgraded.commit("new commit")
+
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        hashes = branch_file.read().split()
+    fresh = MiniGit()
+    assert fresh.branches_for(hashes[0]) == ["main"]
+    assert fresh.branches_for(hashes[1]) == ["main"]
+    with open(os.path.join(".minigit", "commit_branches.idx"), "r") as reverse_index:
+        assert len(reverse_index.readlines()) == 2
+
+
+def test_log_shows_first_line_of_message(setup_minigit, capsys):
+    """
+    Tests that log shows only the first line of a message with other line breaks.
+    """
+    create_test_file("file1.txt")
+    setup_minigit.add("file1.txt")
+    setup_minigit.commit("fix\rbug")
+    capsys.readouterr()
+
+    setup_minigit.log()
+    lines = capsys.readouterr().out.splitlines()
+    setup_minigit.log(last=1)
+
+    assert len(lines) == 2
+    assert lines[1].endswith(" - Message: fix")
+    assert capsys.readouterr().out.splitlines() == lines
+
+
+def test_log_last_reads_branch_log_tail(setup_minigit, capsys, monkeypatch):
+    """
+    Tests that log --last takes messages from the branch log, across read blocks.
+    """
+    monkeypatch.setattr(minigit, "LOG_TAIL_BLOCK", 16)
+    for number in range(5):
+        create_test_file("file1.txt", f"Version {number}")
+        setup_minigit.add("file1.txt")
+        setup_minigit.commit(f"Commit {number}")
+    shutil.rmtree(os.path.join(".minigit", "objects"))
+    capsys.readouterr()
+
+    setup_minigit.log(last=2)
+    lines = capsys.readouterr().out.splitlines()
+
+    assert len(lines) == 3
+    assert lines[1].endswith(" - Message: Commit 3")
+    assert lines[2].endswith(" - Message: Commit 4")
+
+    setup_minigit.log(last=10)
+    assert len(capsys.readouterr().out.splitlines()) == 6
+
+
+def test_log_last_handles_non_ascii_across_blocks(setup_minigit, capsys, monkeypatch):
+    """
+    Tests that log --last decodes messages whose bytes straddle a read block.
+    """
+    monkeypatch.setattr(minigit, "LOG_TAIL_BLOCK", 5)
+    for number in range(4):
+        create_test_file("file1.txt", f"Version {number}")
+        setup_minigit.add("file1.txt")
+        setup_minigit.commit(f"Коммит {number}")
+
+    for count in range(1, 5):
+        capsys.readouterr()
+        setup_minigit.log(last=count)
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == count + 1
+        assert lines[-1].endswith(" - Message: Коммит 3")
+
+
+@pytest.mark.parametrize("count", ["abc", "-1"])
+def test_cli_log_last_rejects_invalid_count(setup_minigit, count):
+    """
+    Tests that log --last reports a usage error for a non-numeric or negative count.
+    """
+    result = subprocess.run(
+        [sys.executable, minigit.__file__, "log", "--last", count],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0
+    assert result.stdout == "Unknown command or incorrect arguments.\n"
+    assert result.stderr == ""
+
+
+def test_log_covers_commits_made_before_branch_log(setup_minigit, capsys):
+    """
+    Tests that a repository without a commit log keeps its full history in log.
+    """
+    for number in range(3):
+        create_test_file("file1.txt", f"Version {number}")
+        setup_minigit.add("file1.txt")
+        setup_minigit.commit(f"old commit {number}")
+    os.remove(os.path.join(".minigit", "refs_main.log"))
+
+    upgraded = MiniGit()
+    create_test_file("file1.txt", "Version 3")
+    upgraded.add("file1.txt")
+    upgraded.commit("new commit")
+    capsys.readouterr()
+
+    upgraded.log()
+    lines = capsys.readouterr().out.splitlines()
+
+    assert len(lines) == 5
+    assert lines[1].endswith(" - Message: old commit 0")
+    assert lines[4].endswith(" - Message: new commit")
+
+
+def test_log_last_shows_recent_commits(setup_minigit, capsys):
+    """
+    Tests that log with a limit prints only the most recent commits.
+    """
+    for number in range(3):
+        create_test_file("file1.txt", f"Version {number}")
+        setup_minigit.add("file1.txt")
+        setup_minigit.commit(f"Commit {number}")
+    capsys.readouterr()
+
+    setup_minigit.log(last=2)
+    lines = capsys.readouterr().out.splitlines()
+
+    assert len(lines) == 3
+    assert lines[1].endswith(" - Message: Commit 1")
+    assert lines[2].endswith(" - Message: Commit 2")
+
+
 def test_clone_creates_new_repository(setup_minigit):
     """
     Tests that the clone command creates a new repository in the target directory.
@@ -103,6 +632,107 @@ def test_clone_creates_new_repository(setup_minigit):
     assert os.path.isdir(os.path.join(clone_dir, ".minigit"))
 
 
+def test_clone_shares_objects(setup_minigit):
+    """
+    Tests that loose objects are hard-linked into a clone and the pack is copied.
+    """
+    filename = "file1.txt"
+    create_test_file(filename)
+    setup_minigit.add(filename)
+    setup_minigit.commit("Initial commit")
+
+    cloned_objects = os.path.join("cloned_repo", ".minigit", "objects")
+    setup_minigit.clone("cloned_repo")
+    objects = os.listdir(setup_minigit.objects_dir)
+    loose = [name for name in objects if not name.startswith("pack")]
+    cloned_pack = os.path.join(cloned_objects, "pack.dat")
+
+    assert len(loose) == 1
+    assert os.path.samefile(
+        os.path.join(setup_minigit.objects_dir, loose[0]),
+        os.path.join(cloned_objects, loose[0]),
+    )
+    assert not os.path.samefile(setup_minigit.pack_file, cloned_pack)
+    with open(setup_minigit.pack_file, "rb") as pack, open(cloned_pack, "rb") as cloned:
+        assert pack.read() == cloned.read()
+
+
+def test_is_btrfs_uses_longest_mount_match(monkeypatch):
+    """
+    Tests that _is_btrfs picks the filesystem of the innermost mount point.
+    """
+    mounts = (
+        "/dev/sda1 / ext4 rw 0 0\n"
+        "/dev/sdb1 /data btrfs rw 0 0\n"
+        "/dev/sdc1 /data/scratch ext4 rw 0 0\n"
+        "/dev/sdd1 /mnt/my\\040disk btrfs rw 0 0\n"
+    )
+    builtin_open = open
+
+    def fake_open(path, *args, **kwargs):
+        if path == "/proc/mounts":
+            return io.StringIO(mounts)
+        return builtin_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(minigit, "open", fake_open, raising=False)
+    monkeypatch.setattr(os.path, "realpath", lambda path: path)
+
+    assert minigit._is_btrfs("/data/repo")
+    assert not minigit._is_btrfs("/data/scratch/repo")
+    assert not minigit._is_btrfs("/database")
+    assert minigit._is_btrfs("/mnt/my disk/repo")
+    assert not minigit._is_btrfs("/home")
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_disable_cow_only_touches_btrfs(setup_minigit, monkeypatch):
+    """
+    Tests that _disable_cow sets NOCOW on Btrfs and leaves other filesystems alone.
+    """
+    calls = []
+
+    class FakeFcntl:
+        @staticmethod
+        def ioctl(fd, request, arg):
+            calls.append((request, arg))
+            return struct.pack("i", 0)
+
+    monkeypatch.setattr(minigit, "fcntl", FakeFcntl)
+    monkeypatch.setattr(minigit, "_is_btrfs", lambda path: False)
+    minigit._disable_cow(".")
+    assert calls == []
+
+    monkeypatch.setattr(minigit, "_is_btrfs", lambda path: True)
+    minigit._disable_cow(".")
+    assert calls[-1] == (minigit.FS_IOC_SETFLAGS, struct.pack("i", minigit.FS_NOCOW_FL))
+
+
+def test_cow_copytree_copies_nested_files(setup_minigit):
+    """
+    Tests that the copy-on-write tree copy reproduces nested files.
+    """
+    os.makedirs(os.path.join("tree", "nested"))
+    create_test_file(os.path.join("tree", "nested", "file1.txt"), "Nested")
+
+    _cow_copytree("tree", os.path.join("copy", "tree"))
+
+    with open(os.path.join("copy", "tree", "nested", "file1.txt"), "r") as copied:
+        assert copied.read() == "Nested"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_kernel_copy_copies_content(setup_minigit):
+    """
+    Tests that the in-kernel copy reproduces the source file.
+    """
+    content = "Kernel copy\n" * 1000
+    create_test_file("file1.txt", content)
+
+    assert _kernel_copy("file1.txt", "file2.txt")
+    with open("file2.txt", "r") as copied:
+        assert copied.read() == content
+
+
 def test_add_nonexistent_file(setup_minigit, capsys):
     """
     Tests that attempting to add a nonexistent file prints an error.
@@ -121,6 +751,24 @@ def test_commit_with_no_changes(setup_minigit, capsys):
     assert "Error: No changes to commit." in captured.out
 
 
+def test_commit_with_missing_index_file(setup_minigit, capsys):
+    """
+    Tests that committing buffered entries works when the index file is gone.
+    """
+    create_test_file("file1.txt")
+    setup_minigit.add("file1.txt")
+    os.remove(os.path.join(".minigit", "index"))
+
+    setup_minigit.commit("Buffered commit")
+    setup_minigit.commit("Retry")
+    captured = capsys.readouterr()
+
+    assert "Committed changes with hash:" in captured.out
+    assert "Error: No changes to commit." in captured.out
+    with open(os.path.join(".minigit", "refs_main.txt"), "r") as branch_file:
+        assert len(branch_file.read().split()) == 1
+
+
 def test_log_no_commits(setup_minigit, capsys):
     """
     Tests that logging with no commits prints an appropriate message.